@@ -1,86 +1,229 @@
 """Analysis and validation tools for load profile simulation"""
 
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Tuple, Optional
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from scipy import stats
-from config import INTERVALS_PER_DAY
+from config import INTERVALS_PER_DAY, INTERVALS_PER_HOUR
+from calendar_fields import decompose_timestamps
+
+# Most memoized results kept per analyzer, least recently used are dropped first
+_MEMO_SIZE = 64
+
+# Season per month number as an index into SEASONS (index 0 is unused)
+SEASONS = ['Winter', 'Spring', 'Summer', 'Fall']
+_SEASON_CODE_LUT = np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)
+
+def _split_by_season(months: np.ndarray, load: np.ndarray) -> Dict[str, np.ndarray]:
+    """Load values per season as contiguous slices of a single stable sort by season code"""
+    codes = _SEASON_CODE_LUT[months]
+    order = np.argsort(codes, kind='stable')
+    sorted_load = load[order]
+    bounds = np.searchsorted(codes[order], np.arange(len(SEASONS) + 1))
+    return {season: sorted_load[bounds[i]:bounds[i + 1]] for i, season in enumerate(SEASONS)}
+
+def _calendar_fields(df: pd.DataFrame, *fields: str) -> List[np.ndarray]:
+    """Calendar fields ('hour', 'month', 'day_of_week') as intp arrays, preferring cached columns
+    
+    Missing fields are all derived from a single decomposition of the timestamps.
+    """
+    decomposed = None
+    arrays = []
+    for field in fields:
+        if field in df.columns:
+            arrays.append(df[field].values.astype(np.intp))
+        else:
+            if decomposed is None:
+                decomposed = decompose_timestamps(df['timestamp'])
+            arrays.append(decomposed[field].astype(np.intp))
+    return arrays
+
+def _calendar_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Hour, month and load arrays of a profile, preferring cached calendar columns"""
+    hour, month = _calendar_fields(df, 'hour', 'month')
+    return {'hour': hour, 'month': month, 'load': df['load'].values}
+
+def _binned_mean(keys: np.ndarray, load: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Mean load per integer key for the keys present, via dense bincount reductions"""
+    counts = np.bincount(keys, minlength=size)
+    sums = np.bincount(keys, weights=load, minlength=size)
+    present = np.flatnonzero(counts)
+    return present, sums[present] / counts[present]
+
+def _content_digest(df: pd.DataFrame, columns: Tuple[str, ...]) -> bytes:
+    """Hash of the raw values of those columns the frame has"""
+    digest = hashlib.sha1()
+    for column in columns:
+        if column not in df.columns:
+            continue
+        values = df[column].to_numpy()
+        if values.dtype == object:
+            # Tz-aware or nullable columns come out as objects, hash them per row instead
+            values = pd.util.hash_pandas_object(df[column], index=False).to_numpy()
+        digest.update(f'{column}:{values.dtype}:{len(values)}'.encode())
+        digest.update(np.ascontiguousarray(values).view(np.uint8))
+    return digest.digest()
 
 class LoadProfileAnalyzer:
     """Analyze and validate load profiles"""
     
     def __init__(self):
         self.metrics = {}
-        
+        self._cache = OrderedDict()
+        # The app shares one analyzer between sessions, which run in separate threads
+        self._lock = threading.Lock()
+    
+    def clear_cache(self):
+        """Drop all memoized results, e.g. after new data was parsed"""
+        with self._lock:
+            self._cache.clear()
+    
+    def _memoized(self, name: str, df: pd.DataFrame, columns: Tuple[str, ...], compute):
+        """Return a copy of compute(df), cached by a content hash of the columns it reads
+        
+        In-place edits of those columns change the hash and recompute; an equal frame, such as a
+        fresh copy handed out by st.cache_data, hits the cache.
+        """
+        key = (name, _content_digest(df, columns))
+        
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+        if result is None:
+            result = compute(df)
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > _MEMO_SIZE:
+                    self._cache.popitem(last=False)
+        
+        # Callers may modify what they get back, the cached result must stay intact
+        return copy.deepcopy(result)
+    
     def calculate_statistics(self, df: pd.DataFrame) -> Dict:
         """Calculate comprehensive statistics for a load profile"""
+        return self._memoized('statistics', df, ('load',), self._compute_statistics)
+    
+    def _compute_statistics(self, df: pd.DataFrame) -> Dict:
+        values = df['load'].to_numpy(dtype=np.float64, copy=False)
+        n = values.shape[0]
+        
+        # One pass each for the sum and extremes, everything else is derived
+        total = values.sum()
+        min_load = values.min()
+        max_load = values.max()
+        
+        mean = total / n
+        # Squares of the deviations, not of the raw values, so a small spread around a large mean keeps its precision
+        deviations = values - mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(np.dot(deviations, deviations) / (n - 1))  # Sample std (ddof=1)
+        
+        # Median via partial sort instead of a full sort
+        mid = n // 2
+        if n % 2:
+            median = np.partition(values, mid)[mid]
+        else:
+            part = np.partition(values, [mid - 1, mid])
+            median = (part[mid - 1] + part[mid]) / 2
+        
         stats = {
-            'mean': df['load'].mean(),
-            'median': df['load'].median(),
-            'std': df['load'].std(),
-            'min': df['load'].min(),
-            'max': df['load'].max(),
-            'peak_to_average': df['load'].max() / df['load'].mean(),
-            'load_factor': df['load'].mean() / df['load'].max(),
-            'total_energy': df['load'].sum() * 0.25,  # kWh assuming 15-min intervals
-            'cv': df['load'].std() / df['load'].mean() * 100  # Coefficient of variation
+            'mean': mean,
+            'median': median,
+            'std': std,
+            'min': min_load,
+            'max': max_load,
+            'peak_to_average': max_load / mean,
+            'load_factor': mean / max_load,
+            'total_energy': total / INTERVALS_PER_HOUR,  # kWh for 15-min intervals
+            'cv': std / mean * 100  # Coefficient of variation
         }
         return stats
     
     def calculate_daily_patterns(self, df: pd.DataFrame) -> pd.DataFrame:
         """Extract daily load patterns"""
-        df['hour'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
-        df['date'] = df['timestamp'].dt.date
+        # Work on local arrays only, the caller's frame is left untouched
+        hour, day_of_week = _calendar_fields(df, 'hour', 'day_of_week')
+        load = np.asarray(df['load'].values, dtype=np.float64)
+        is_weekend = day_of_week >= 5
+        
+        # One pass over the load with a combined 48-bin key: weekday hours 0-23, weekend hours 24-47
+        key = hour + 24 * is_weekend.astype(np.intp)
+        counts = np.bincount(key, minlength=48)
+        sums = np.bincount(key, weights=load, minlength=48)
         
         # Average hourly pattern
-        hourly_pattern = df.groupby('hour')['load'].agg(['mean', 'std'])
+        all_counts = counts[:24] + counts[24:]
+        all_sums = sums[:24] + sums[24:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hour_mean = all_sums / all_counts
+            # Squared deviations from each hour's own mean, which keeps low-variance hours precise;
+            # shifting by one sample first keeps constant hours at exactly zero
+            shifted = load - load[0] if load.size else load
+            shifted_mean = np.bincount(hour, weights=shifted, minlength=24) / all_counts
+            deviations = shifted - shifted_mean[hour]
+            sums_sq = np.bincount(hour, weights=deviations * deviations, minlength=24)
+            hour_std = np.sqrt(sums_sq / (all_counts - 1))
+        hours = np.flatnonzero(all_counts)
+        mean = hour_mean[hours]
+        std = hour_std[hours]
+        std[all_counts[hours] < 2] = np.nan
+        hourly_pattern = pd.DataFrame({'mean': mean, 'std': std}, index=pd.Index(hours, name='hour'))
         
         # Weekday vs Weekend patterns
-        df['is_weekend'] = df['day_of_week'].isin([5, 6])
-        weekday_pattern = df[~df['is_weekend']].groupby('hour')['load'].mean()
-        weekend_pattern = df[df['is_weekend']].groupby('hour')['load'].mean()
+        weekday_pattern = self._hourly_mean(counts[:24], sums[:24])
+        weekend_pattern = self._hourly_mean(counts[24:], sums[24:])
         
         return hourly_pattern, weekday_pattern, weekend_pattern
     
+    @staticmethod
+    def _hourly_mean(counts: np.ndarray, sums: np.ndarray) -> pd.Series:
+        """Mean load per hour of day for the hours present in the data"""
+        hours = np.flatnonzero(counts)
+        return pd.Series(sums[hours] / counts[hours], index=pd.Index(hours, name='hour'), name='load')
+    
     def calculate_seasonal_patterns(self, df: pd.DataFrame) -> Dict:
         """Calculate seasonal load characteristics"""
-        df['month'] = df['timestamp'].dt.month
-        df['season'] = df['month'].apply(self._get_season)
+        return self._memoized('seasonal_patterns', df, ('timestamp', 'month', 'load'), self._compute_seasonal_patterns)
+    
+    def _compute_seasonal_patterns(self, df: pd.DataFrame) -> Dict:
+        prof = _calendar_arrays(df)
+        by_season = _split_by_season(prof['month'], prof['load'])
         
         seasonal_stats = {}
-        for season in ['Winter', 'Spring', 'Summer', 'Fall']:
-            season_data = df[df['season'] == season]['load']
-            if not season_data.empty:
+        for season in SEASONS:
+            season_data = by_season[season]
+            if season_data.size:
                 seasonal_stats[season] = {
-                    'mean': season_data.mean(),
+                    'mean': season_data.mean(dtype=np.float64),
                     'peak': season_data.max(),
                     'valley': season_data.min(),
-                    'std': season_data.std()
+                    'std': season_data.std(ddof=1, dtype=np.float64) if season_data.size > 1 else np.nan
                 }
         
         return seasonal_stats
     
-    def _get_season(self, month: int) -> str:
-        """Get season from month"""
-        if month in [12, 1, 2]:
-            return 'Winter'
-        elif month in [3, 4, 5]:
-            return 'Spring'
-        elif month in [6, 7, 8]:
-            return 'Summer'
-        else:
-            return 'Fall'
-    
     def detect_anomalies(self, df: pd.DataFrame, threshold: float = 3.0) -> pd.DataFrame:
         """Detect anomalies using z-score method"""
-        df['z_score'] = np.abs(stats.zscore(df['load']))
-        df['is_anomaly'] = df['z_score'] > threshold
-        
-        anomalies = df[df['is_anomaly']].copy()
+        values = df['load'].to_numpy(dtype=np.float64, copy=False)
+        n = len(values)
+        if n == 0:
+            return df.assign(z_score=pd.Series(dtype=np.float64), is_anomaly=pd.Series(dtype=bool))
+        
+        # Reuse the memoized mean/std; z-scores use the population std (ddof=0)
+        stats = self.calculate_statistics(df)
+        population_std = stats['std'] * np.sqrt((n - 1) / n) if n > 1 else 0.0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z_scores = np.abs(values - stats['mean']) / population_std
+        
+        # Only the anomalous rows are copied, the input frame is left untouched
+        rows = np.flatnonzero(z_scores > threshold)
+        anomalies = df.iloc[rows].assign(z_score=z_scores[rows], is_anomaly=True)
         return anomalies
     
     def compare_profiles(self, source_df: pd.DataFrame, simulated_df: pd.DataFrame) -> Dict:
@@ -108,19 +251,20 @@ class LoadProfileAnalyzer:
             correlation = np.corrcoef(source_df['load'], simulated_df['load'])[0, 1]
             comparison['correlation'] = correlation
         
-        # Load duration curve comparison
-        source_ldc = np.sort(source_df['load'])[::-1]
-        simulated_ldc = np.sort(simulated_df['load'])[::-1]
-        
+        # Load duration curve comparison (percentiles don't depend on the curve's sort order)
         comparison['load_duration'] = {
-            'source_percentiles': np.percentile(source_ldc, [10, 25, 50, 75, 90]),
-            'simulated_percentiles': np.percentile(simulated_ldc, [10, 25, 50, 75, 90])
+            'source_percentiles': np.percentile(source_df['load'].to_numpy(dtype=np.float64, copy=False), [10, 25, 50, 75, 90]),
+            'simulated_percentiles': np.percentile(simulated_df['load'].to_numpy(dtype=np.float64, copy=False), [10, 25, 50, 75, 90])
         }
         
         return comparison
     
     def validate_mapping(self, simulated_df: pd.DataFrame) -> Dict:
         """Validate the quality of day-type mapping"""
+        return self._memoized('validation', simulated_df, ('timestamp', 'month', 'day_of_week', 'load'),
+                              self._compute_validation)
+    
+    def _compute_validation(self, simulated_df: pd.DataFrame) -> Dict:
         validation = {
             'holiday_consistency': True,
             'weekend_pattern_preserved': True,
@@ -137,9 +281,17 @@ class LoadProfileAnalyzer:
             validation['issues'].append(f"Missing data: {expected_points - actual_points} intervals")
         
         # Check weekend patterns
-        simulated_df['day_of_week'] = simulated_df['timestamp'].dt.dayofweek
-        weekend_loads = simulated_df[simulated_df['day_of_week'].isin([5, 6])]['load'].mean()
-        weekday_loads = simulated_df[~simulated_df['day_of_week'].isin([5, 6])]['load'].mean()
+        load = simulated_df['load'].values
+        day_of_week, = _calendar_fields(simulated_df, 'day_of_week')
+        is_weekend = day_of_week >= 5
+        
+        # Two sums on the raw arrays instead of two filtered frame copies
+        weekend_count = int(is_weekend.sum())
+        weekday_count = len(load) - weekend_count
+        weekend_sum = float(load[is_weekend].sum(dtype=np.float64)) if weekend_count else 0.0
+        weekday_sum = float(load.sum(dtype=np.float64)) - weekend_sum
+        weekend_loads = weekend_sum / weekend_count if weekend_count else np.nan
+        weekday_loads = weekday_sum / weekday_count if weekday_count else np.nan
         
         if weekend_loads > weekday_loads * 0.95:
             validation['weekend_pattern_preserved'] = False
@@ -170,6 +322,8 @@ class VisualizationGenerator:
     @staticmethod
     def create_comparison_plot(source_df: pd.DataFrame, simulated_dfs: Dict[int, pd.DataFrame]) -> go.Figure:
         """Create comprehensive comparison visualization"""
+        from plotly.subplots import make_subplots  # deferred: slow to import, only needed here
+        
         fig = make_subplots(
             rows=3, cols=2,
             subplot_titles=(
@@ -184,18 +338,30 @@ class VisualizationGenerator:
         # Colors for different years
         colors = ['blue', 'red', 'green', 'purple', 'orange']
         
+        # Traces are collected and added in one batch so Plotly validates the figure once
+        traces, rows, cols = [], [], []
+        
+        def add(trace, row, col):
+            traces.append(trace)
+            rows.append(row)
+            cols.append(col)
+        
+        # Hour/month arrays are derived once per profile and shared by all panels
+        source_prof = _calendar_arrays(source_df)
+        sim_profs = {year: _calendar_arrays(sim_df) for year, sim_df in simulated_dfs.items()}
+        
         # 1. Daily Average Profiles
-        source_hourly = source_df.groupby(source_df['timestamp'].dt.hour)['load'].mean()
-        fig.add_trace(
-            go.Scatter(x=source_hourly.index, y=source_hourly.values,
+        hours, hourly_mean = _binned_mean(source_prof['hour'], source_prof['load'], 24)
+        add(
+            go.Scatter(x=hours, y=hourly_mean,
                       name=f"Source", line=dict(color='blue', width=2)),
             row=1, col=1
         )
         
-        for idx, (year, sim_df) in enumerate(simulated_dfs.items()):
-            sim_hourly = sim_df.groupby(sim_df['timestamp'].dt.hour)['load'].mean()
-            fig.add_trace(
-                go.Scatter(x=sim_hourly.index, y=sim_hourly.values,
+        for idx, (year, prof) in enumerate(sim_profs.items()):
+            hours, hourly_mean = _binned_mean(prof['hour'], prof['load'], 24)
+            add(
+                go.Scatter(x=hours, y=hourly_mean,
                           name=f"Simulated {year}", 
                           line=dict(color=colors[idx % len(colors)], dash='dash')),
                 row=1, col=1
@@ -203,7 +369,7 @@ class VisualizationGenerator:
         
         # 2. Weekly Patterns (show one week)
         source_week = source_df.head(INTERVALS_PER_DAY * 7)
-        fig.add_trace(
+        add(
             go.Scatter(x=list(range(len(source_week))), y=source_week['load'].values,
                       name="Source Week", line=dict(color='blue', width=1)),
             row=1, col=2
@@ -211,7 +377,7 @@ class VisualizationGenerator:
         
         for idx, (year, sim_df) in enumerate(simulated_dfs.items()):
             sim_week = sim_df.head(INTERVALS_PER_DAY * 7)
-            fig.add_trace(
+            add(
                 go.Scatter(x=list(range(len(sim_week))), y=sim_week['load'].values,
                           name=f"Sim {year} Week",
                           line=dict(color=colors[idx % len(colors)], width=1, dash='dot')),
@@ -219,18 +385,16 @@ class VisualizationGenerator:
             )
         
         # 3. Load Duration Curves
-        source_ldc = np.sort(source_df['load'].values)[::-1]
-        percentages = np.linspace(0, 100, len(source_ldc))
-        fig.add_trace(
+        source_ldc, percentages = VisualizationGenerator._load_duration_curve(source_df['load'].values)
+        add(
             go.Scatter(x=percentages, y=source_ldc,
                       name="Source LDC", line=dict(color='blue', width=2)),
             row=2, col=1
         )
         
         for idx, (year, sim_df) in enumerate(simulated_dfs.items()):
-            sim_ldc = np.sort(sim_df['load'].values)[::-1]
-            sim_percentages = np.linspace(0, 100, len(sim_ldc))
-            fig.add_trace(
+            sim_ldc, sim_percentages = VisualizationGenerator._load_duration_curve(sim_df['load'].values)
+            add(
                 go.Scatter(x=sim_percentages, y=sim_ldc,
                           name=f"Sim {year} LDC",
                           line=dict(color=colors[idx % len(colors)], dash='dash')),
@@ -238,49 +402,55 @@ class VisualizationGenerator:
             )
         
         # 4. Monthly Averages
-        source_monthly = source_df.groupby(source_df['timestamp'].dt.month)['load'].mean()
-        fig.add_trace(
-            go.Bar(x=source_monthly.index, y=source_monthly.values,
+        months, monthly_mean = _binned_mean(source_prof['month'], source_prof['load'], 13)
+        add(
+            go.Bar(x=months, y=monthly_mean,
                    name="Source Monthly", marker_color='blue', opacity=0.7),
             row=2, col=2
         )
         
-        for idx, (year, sim_df) in enumerate(simulated_dfs.items()):
-            sim_monthly = sim_df.groupby(sim_df['timestamp'].dt.month)['load'].mean()
-            fig.add_trace(
-                go.Bar(x=sim_monthly.index, y=sim_monthly.values,
+        for idx, (year, prof) in enumerate(sim_profs.items()):
+            months, monthly_mean = _binned_mean(prof['month'], prof['load'], 13)
+            add(
+                go.Bar(x=months, y=monthly_mean,
                        name=f"Sim {year}",
                        marker_color=colors[idx % len(colors)], opacity=0.5),
                 row=2, col=2
             )
         
-        # 5. Distribution Comparison
-        fig.add_trace(
-            go.Histogram(x=source_df['load'], name="Source Dist",
-                        marker_color='blue', opacity=0.5, nbinsx=50),
+        # 5. Distribution Comparison (binned here with shared edges, only counts go to the browser)
+        edges = np.histogram_bin_edges(
+            np.concatenate([source_prof['load']] + [prof['load'] for prof in sim_profs.values()]), bins=50
+        )
+        centers = (edges[:-1] + edges[1:]) / 2
+        
+        source_counts, _ = np.histogram(source_prof['load'], bins=edges)
+        add(
+            go.Bar(x=centers, y=source_counts, name="Source Dist",
+                   marker_color='blue', opacity=0.5),
             row=3, col=1
         )
         
-        for idx, (year, sim_df) in enumerate(simulated_dfs.items()):
-            fig.add_trace(
-                go.Histogram(x=sim_df['load'], name=f"Sim {year}",
-                            marker_color=colors[idx % len(colors)], opacity=0.3, nbinsx=50),
+        for idx, (year, prof) in enumerate(sim_profs.items()):
+            sim_counts, _ = np.histogram(prof['load'], bins=edges)
+            add(
+                go.Bar(x=centers, y=sim_counts, name=f"Sim {year}",
+                       marker_color=colors[idx % len(colors)], opacity=0.3),
                 row=3, col=1
             )
         
         # 6. Seasonal Box Plots
-        source_df['season'] = source_df['timestamp'].dt.month.apply(
-            lambda m: 'Winter' if m in [12, 1, 2] else 'Spring' if m in [3, 4, 5] 
-            else 'Summer' if m in [6, 7, 8] else 'Fall'
-        )
+        by_season = _split_by_season(source_prof['month'], source_prof['load'])
         
-        for season in ['Winter', 'Spring', 'Summer', 'Fall']:
-            season_data = source_df[source_df['season'] == season]['load']
-            fig.add_trace(
+        for season in SEASONS:
+            season_data = by_season[season]
+            add(
                 go.Box(y=season_data, name=f"{season}", marker_color='blue'),
                 row=3, col=2
             )
         
+        fig.add_traces(traces, rows=rows, cols=cols)
+        
         # Update layout
         fig.update_xaxes(title_text="Hour", row=1, col=1)
         fig.update_xaxes(title_text="Interval", row=1, col=2)
@@ -305,9 +475,21 @@ class VisualizationGenerator:
         
         return fig
     
+    @staticmethod
+    def _load_duration_curve(values: np.ndarray, max_points: int = 2000) -> Tuple[np.ndarray, np.ndarray]:
+        """Descending load duration curve, downsampled to at most max_points for plotting"""
+        ldc = np.sort(values)[::-1]
+        percentages = np.linspace(0, 100, len(ldc))
+        if len(ldc) > max_points:
+            idx = np.linspace(0, len(ldc) - 1, max_points).astype(int)
+            ldc, percentages = ldc[idx], percentages[idx]
+        return ldc, percentages
+    
     @staticmethod
     def create_pattern_matching_plot(source_df: pd.DataFrame, simulated_df: pd.DataFrame) -> go.Figure:
         """Visualize how well patterns are matched between source and simulation"""
+        from plotly.subplots import make_subplots
+        
         fig = make_subplots(
             rows=2, cols=2,
             subplot_titles=(
@@ -3,14 +3,146 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
 from datetime import datetime
 import io
-from config import FEDERAL_STATES
+from config import FEDERAL_STATES, STATE_CODES
 from load_profile_processor import LoadProfileProcessor
 from analysis_tools import LoadProfileAnalyzer, VisualizationGenerator
 
+def _lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Row indices of a Largest-Triangle-Three-Buckets downsampling of (x, y) to n points"""
+    size = len(y)
+    if size <= n or n < 3:
+        return np.arange(size)
+    
+    edges = np.linspace(1, size - 1, n - 1).astype(np.intp)
+    selected = np.empty(n, dtype=np.intp)
+    selected[0], selected[-1] = 0, size - 1
+    prev = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the following bucket (or the last point) is the third triangle corner
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs((x[prev] - next_x) * (by - y[prev]) - (x[prev] - bx) * (next_y - y[prev]))
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
+def _downsample(df: pd.DataFrame, n: int = 4000) -> pd.DataFrame:
+    """Reduce a profile to n points with LTTB so Plotly doesn't serialize every interval
+    
+    Unlike a plain stride, LTTB keeps the peaks and troughs that shape the curve.
+    """
+    if len(df) <= n:
+        return df
+    x = df['timestamp'].values.astype('datetime64[s]').astype(np.float64)
+    y = np.asarray(df['load'].values, dtype=np.float64)
+    return df.iloc[_lttb_indices(x, y, n)]
+
+@st.cache_resource(show_spinner=False)
+def _get_processor(state_code: str) -> LoadProfileProcessor:
+    """One processor per state, so its holiday caches survive reruns"""
+    return LoadProfileProcessor(state_code)
+
+@st.cache_resource(show_spinner=False)
+def _get_analyzer() -> LoadProfileAnalyzer:
+    """One analyzer for all sessions and reruns
+    
+    Its memo is keyed on frame content, so the fresh copies st.cache_data hands out on every
+    rerun, and the same upload in another session, reuse results computed once.
+    """
+    return LoadProfileAnalyzer()
+
+@st.cache_resource(show_spinner=False)
+def _get_viz_generator() -> VisualizationGenerator:
+    """Stateless plot builder shared by all sessions"""
+    return VisualizationGenerator()
+
+@st.cache_data(show_spinner=False)
+def _parse(file_bytes: bytes, state_code: str) -> pd.DataFrame:
+    """Parse an upload once per (file, state) instead of on every rerun"""
+    # A throwaway processor, as parsing records source_year on the instance
+    return LoadProfileProcessor(state_code).parse_load_profile(file_bytes)
+
+@st.cache_data(show_spinner=False)
+def _simulate(file_bytes: bytes, state_code: str, years: tuple) -> dict:
+    """Parse and simulate once per (file, state, years) so reruns are cache hits"""
+    # Mapping a year takes milliseconds, so years run in-process on the cached processor
+    source_df = _parse(file_bytes, state_code)
+    return _get_processor(state_code).generate_future_profiles(source_df, list(years))
+
+@st.cache_data(show_spinner=False)
+def _csv_bytes(year: int, df: pd.DataFrame) -> bytes:
+    """Annotated CSV download payload for a simulated year, serialized once per profile"""
+    return LoadProfileProcessor.export_to_csv(df, include_source=True).encode('utf-8')
+
+@st.cache_data(show_spinner=False)
+def _excel_bytes(source_df: pd.DataFrame, results: dict) -> bytes:
+    """Workbook with the source and every simulated year, built in memory once per result set"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        source_df.to_excel(writer, sheet_name='Source Data', index=False)
+        for year, df in results.items():
+            df.to_excel(writer, sheet_name=f'Simulated {year}', index=False)
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner=False)
+def _build_report(state_code: str, source_year: int, target_years: tuple, source_stats: dict,
+                  sim_stats: dict, sim_validations: dict, seasonal_stats: dict) -> str:
+    """Markdown report text, rebuilt only when the underlying figures change
+    
+    Takes the small statistics dicts rather than the DataFrames so the cache key is cheap to hash.
+    The title and generation time are left to the caller, a cached timestamp would go stale.
+    """
+    report_lines = [
+        "",
+        "## Configuration",
+        f"- Federal State: {state_code} ({FEDERAL_STATES[state_code]})",
+        f"- Source Year: {source_year}",
+        f"- Target Years: {', '.join(map(str, target_years))}",
+        "",
+        "## Source Profile Statistics",
+    ]
+    
+    for key, value in source_stats.items():
+        report_lines.append(f"- {key}: {value:.2f}")
+    
+    report_lines.extend(["", "## Simulation Results"])
+    
+    for year, stats in sim_stats.items():
+        validation = sim_validations[year]
+        
+        report_lines.extend([
+            f"", 
+            f"### Year {year}",
+            f"- Validation Score: {validation['overall_score']:.1f}%",
+            f"- Average Load: {stats['mean']:.2f}",
+            f"- Peak Load: {stats['max']:.2f}",
+            f"- Load Factor: {stats['load_factor']:.2%}",
+            f"- Total Energy: {stats['total_energy']:.0f} kWh"
+        ])
+        
+        if validation['issues']:
+            report_lines.append("- Issues:")
+            for issue in validation['issues']:
+                report_lines.append(f"  * {issue}")
+    
+    report_lines.extend([
+        "",
+        "## Seasonal Analysis",
+    ])
+    
+    for season, stats in seasonal_stats.items():
+        report_lines.append(f"- {season}: Mean={stats['mean']:.2f}, Peak={stats['peak']:.2f}")
+    
+    return "\n".join(report_lines)
+
 st.set_page_config(
     page_title="Load Profile Simulator - Enhanced",
     page_icon="⚡",
@@ -49,10 +181,14 @@ if 'source_df' not in st.session_state:
     st.session_state.source_df = None
 if 'results' not in st.session_state:
     st.session_state.results = {}
-if 'analyzer' not in st.session_state:
-    st.session_state.analyzer = LoadProfileAnalyzer()
-if 'viz_generator' not in st.session_state:
-    st.session_state.viz_generator = VisualizationGenerator()
+if 'sim_stats' not in st.session_state:
+    st.session_state.sim_stats = {}
+if 'sim_validations' not in st.session_state:
+    st.session_state.sim_validations = {}
+
+# Analysis helpers are shared by all sessions rather than created per session
+analyzer = _get_analyzer()
+viz_generator = _get_viz_generator()
 
 # Sidebar configuration
 with st.sidebar:
@@ -60,7 +196,7 @@ with st.sidebar:
     
     state_code = st.selectbox(
         "Select Federal State",
-        options=list(FEDERAL_STATES.keys()),
+        options=STATE_CODES,
         format_func=lambda x: f"{x} - {FEDERAL_STATES[x]}",
         help="Choose the German federal state for holiday calculations"
     )
@@ -101,9 +237,8 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs([
 with tab1:
     if uploaded_file is not None:
         try:
-            content = uploaded_file.read().decode('utf-8')
-            processor = LoadProfileProcessor(state_code)
-            source_df = processor.parse_load_profile(content)
+            processor = _get_processor(state_code)
+            source_df = _parse(uploaded_file.getvalue(), state_code)
             
             if not source_df.empty:
                 st.session_state.processor = processor
@@ -112,7 +247,7 @@ with tab1:
                 col1, col2, col3, col4 = st.columns(4)
                 
                 # Display key metrics
-                stats = st.session_state.analyzer.calculate_statistics(source_df)
+                stats = analyzer.calculate_statistics(source_df)
                 
                 with col1:
                     st.metric("📈 Average Load", f"{stats['mean']:.2f}")
@@ -126,7 +261,8 @@ with tab1:
                 # Source profile visualization
                 st.subheader("Source Load Profile Analysis")
                 
-                # Create subplots for source analysis
+                # Create subplots for source analysis (imported here to keep app start-up light)
+                from plotly.subplots import make_subplots
                 fig = make_subplots(
                     rows=2, cols=2,
                     subplot_titles=('Full Year Profile', 'Daily Average Pattern', 
@@ -134,14 +270,15 @@ with tab1:
                 )
                 
                 # Full year profile
+                plot_df = _downsample(source_df)
                 fig.add_trace(
-                    go.Scatter(x=source_df['timestamp'], y=source_df['load'],
-                              mode='lines', name='Load', line=dict(color='blue', width=1)),
+                    go.Scattergl(x=plot_df['timestamp'], y=plot_df['load'],
+                                mode='lines', name='Load', line=dict(color='blue', width=1)),
                     row=1, col=1
                 )
                 
                 # Daily average pattern
-                hourly_avg = source_df.groupby(source_df['timestamp'].dt.hour)['load'].mean()
+                hourly_avg = source_df.groupby('hour')['load'].mean()
                 fig.add_trace(
                     go.Scatter(x=hourly_avg.index, y=hourly_avg.values,
                               mode='lines+markers', name='Hourly Avg',
@@ -152,20 +289,21 @@ with tab1:
                 # Weekly pattern (first week)
                 week_data = source_df.head(96 * 7)
                 fig.add_trace(
-                    go.Scatter(x=list(range(len(week_data))), y=week_data['load'],
-                              mode='lines', name='Week Pattern',
-                              line=dict(color='purple', width=1)),
+                    go.Scattergl(x=list(range(len(week_data))), y=week_data['load'],
+                                mode='lines', name='Week Pattern',
+                                line=dict(color='purple', width=1)),
                     row=2, col=1
                 )
                 
-                # Load distribution
+                # Load distribution (binned here so only the 50 counts go to the browser)
+                counts, edges = np.histogram(source_df['load'].to_numpy(), bins=50)
                 fig.add_trace(
-                    go.Histogram(x=source_df['load'], nbinsx=50, name='Distribution',
-                                marker_color='orange'),
+                    go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                           name='Distribution', marker_color='orange'),
                     row=2, col=2
                 )
                 
-                fig.update_layout(height=700, showlegend=False)
+                fig.update_layout(height=700, showlegend=False, uirevision='src')
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Data quality check
@@ -195,33 +333,39 @@ with tab1:
         st.info("👆 Please upload a load profile CSV file to begin")
 
 with tab2:
-    if process_button and st.session_state.processor and st.session_state.source_df is not None:
+    if process_button and uploaded_file is not None and st.session_state.processor and st.session_state.source_df is not None:
         if not target_years:
             st.warning("⚠️ Please select at least one target year")
         else:
             with st.spinner("🔄 Generating simulations and analyzing patterns..."):
                 try:
-                    results = st.session_state.processor.generate_future_profiles(
-                        st.session_state.source_df,
-                        target_years
-                    )
+                    results = _simulate(uploaded_file.getvalue(), state_code, tuple(target_years))
                     st.session_state.results = results
+                    # Per-year figures the other tabs read instead of recomputing
+                    st.session_state.sim_stats = {y: analyzer.calculate_statistics(d) for y, d in results.items()}
+                    st.session_state.sim_validations = {y: analyzer.validate_mapping(d) for y, d in results.items()}
                     
                     st.success(f"✅ Successfully generated profiles for {len(results)} years")
+                    source_stats = analyzer.calculate_statistics(st.session_state.source_df)
+                    
+                    # Source week sample shared by every year's comparison figure
+                    sample_size = 96 * 7
+                    source_sample = st.session_state.source_df['load'].to_numpy()[:sample_size]
+                    sample_x = np.arange(sample_size)
                     
                     # Display results for each year
                     for year, df in results.items():
                         with st.expander(f"📅 Year {year} Simulation", expanded=True):
                             # Calculate statistics
-                            sim_stats = st.session_state.analyzer.calculate_statistics(df)
+                            sim_stats = st.session_state.sim_stats[year]
                             
                             col1, col2, col3, col4 = st.columns(4)
                             with col1:
                                 st.metric("Avg Load", f"{sim_stats['mean']:.2f}",
-                                         f"{sim_stats['mean'] - st.session_state.analyzer.calculate_statistics(st.session_state.source_df)['mean']:.2f}")
+                                         f"{sim_stats['mean'] - source_stats['mean']:.2f}")
                             with col2:
                                 st.metric("Peak Load", f"{sim_stats['max']:.2f}",
-                                         f"{sim_stats['max'] - st.session_state.analyzer.calculate_statistics(st.session_state.source_df)['max']:.2f}")
+                                         f"{sim_stats['max'] - source_stats['max']:.2f}")
                             with col3:
                                 st.metric("Total Energy", f"{sim_stats['total_energy']:.0f} kWh")
                             with col4:
@@ -229,25 +373,23 @@ with tab2:
                             
                             # Sample visualization
                             st.subheader("Sample Week Comparison")
-                            sample_size = 96 * 7
                             
                             fig = go.Figure()
                             
                             # Source sample
-                            source_sample = st.session_state.source_df.head(sample_size)
-                            fig.add_trace(go.Scatter(
-                                x=list(range(len(source_sample))),
-                                y=source_sample['load'],
+                            fig.add_trace(go.Scattergl(
+                                x=sample_x[:len(source_sample)],
+                                y=source_sample,
                                 mode='lines',
                                 name='Source',
                                 line=dict(color='blue', width=2)
                             ))
                             
                             # Simulated sample
-                            sim_sample = df.head(sample_size)
-                            fig.add_trace(go.Scatter(
-                                x=list(range(len(sim_sample))),
-                                y=sim_sample['load'],
+                            sim_sample = df['load'].to_numpy()[:sample_size]
+                            fig.add_trace(go.Scattergl(
+                                x=sample_x[:len(sim_sample)],
+                                y=sim_sample,
                                 mode='lines',
                                 name=f'Simulated {year}',
                                 line=dict(color='red', width=2, dash='dash')
@@ -264,10 +406,9 @@ with tab2:
                             st.plotly_chart(fig, use_container_width=True)
                             
                             # Download button
-                            csv_content = st.session_state.processor.export_to_csv(df, include_source=True)
                             st.download_button(
                                 label=f"📥 Download {year} Profile with Annotations",
-                                data=csv_content,
+                                data=_csv_bytes(year, df),
                                 file_name=f"load_profile_{year}_simulated.csv",
                                 mime="text/csv",
                                 key=f"download_{year}_tab2"
@@ -280,10 +421,9 @@ with tab2:
         st.info(f"📊 Showing previous results for: {', '.join(map(str, st.session_state.results.keys()))}")
         for year, df in st.session_state.results.items():
             with st.expander(f"📅 Year {year}"):
-                csv_content = st.session_state.processor.export_to_csv(df, include_source=True)
                 st.download_button(
                     label=f"📥 Download {year} Profile",
-                    data=csv_content,
+                    data=_csv_bytes(year, df),
                     file_name=f"load_profile_{year}_simulated.csv",
                     mime="text/csv",
                     key=f"download_{year}_existing"
@@ -294,7 +434,7 @@ with tab3:
         st.header("📊 Comprehensive Comparison Analysis")
         
         # Generate comprehensive comparison
-        comparison_fig = st.session_state.viz_generator.create_comparison_plot(
+        comparison_fig = viz_generator.create_comparison_plot(
             st.session_state.source_df,
             st.session_state.results
         )
@@ -305,7 +445,7 @@ with tab3:
         st.subheader("📈 Statistical Comparison")
         
         for year, sim_df in st.session_state.results.items():
-            comparison = st.session_state.analyzer.compare_profiles(
+            comparison = analyzer.compare_profiles(
                 st.session_state.source_df,
                 sim_df
             )
@@ -341,7 +481,7 @@ with tab4:
         st.header("✅ Validation Results")
         
         for year, sim_df in st.session_state.results.items():
-            validation = st.session_state.analyzer.validate_mapping(sim_df)
+            validation = st.session_state.sim_validations[year]
             
             with st.expander(f"Year {year} Validation", expanded=True):
                 # Overall score gauge
@@ -379,22 +519,24 @@ with tab4:
                 
                 # Anomaly detection
                 if show_anomalies:
-                    anomalies = st.session_state.analyzer.detect_anomalies(sim_df)
+                    anomalies = analyzer.detect_anomalies(sim_df)
                     if not anomalies.empty:
                         st.subheader("🔍 Anomalies Detected")
                         st.write(f"Found {len(anomalies)} potential anomalies")
                         
+                        plot_df = _downsample(sim_df)
                         fig = go.Figure()
-                        fig.add_trace(go.Scatter(
-                            x=sim_df['timestamp'],
-                            y=sim_df['load'],
+                        # Plain arrays skip Plotly's per-Series conversion when serializing
+                        fig.add_trace(go.Scattergl(
+                            x=plot_df['timestamp'].to_numpy(),
+                            y=plot_df['load'].to_numpy(np.float64),
                             mode='lines',
                             name='Normal',
                             line=dict(color='blue', width=1)
                         ))
                         fig.add_trace(go.Scatter(
-                            x=anomalies['timestamp'],
-                            y=anomalies['load'],
+                            x=anomalies['timestamp'].to_numpy(),
+                            y=anomalies['load'].to_numpy(np.float64),
                             mode='markers',
                             name='Anomalies',
                             marker=dict(color='red', size=8, symbol='x')
@@ -411,71 +553,38 @@ with tab5:
     if st.session_state.source_df is not None and st.session_state.results:
         st.header("📋 Detailed Analysis Report")
         
-        # Generate comprehensive report
-        report_lines = [
-            "# LOAD PROFILE SIMULATION REPORT",
-            f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            "",
-            "## Configuration",
-            f"- Federal State: {state_code} ({FEDERAL_STATES[state_code]})",
-            f"- Source Year: {st.session_state.processor.source_year}",
-            f"- Target Years: {', '.join(map(str, target_years))}",
-            "",
-            "## Source Profile Statistics",
-        ]
-        
-        source_stats = st.session_state.analyzer.calculate_statistics(st.session_state.source_df)
-        for key, value in source_stats.items():
-            report_lines.append(f"- {key}: {value:.2f}")
-        
-        report_lines.extend(["", "## Simulation Results"])
-        
-        for year, sim_df in st.session_state.results.items():
-            sim_stats = st.session_state.analyzer.calculate_statistics(sim_df)
-            validation = st.session_state.analyzer.validate_mapping(sim_df)
-            
-            report_lines.extend([
-                f"", 
-                f"### Year {year}",
-                f"- Validation Score: {validation['overall_score']:.1f}%",
-                f"- Average Load: {sim_stats['mean']:.2f}",
-                f"- Peak Load: {sim_stats['max']:.2f}",
-                f"- Load Factor: {sim_stats['load_factor']:.2%}",
-                f"- Total Energy: {sim_stats['total_energy']:.0f} kWh"
-            ])
-            
-            if validation['issues']:
-                report_lines.append("- Issues:")
-                for issue in validation['issues']:
-                    report_lines.append(f"  * {issue}")
-        
-        report_lines.extend([
-            "",
-            "## Seasonal Analysis",
-        ])
-        
-        seasonal_stats = st.session_state.analyzer.calculate_seasonal_patterns(st.session_state.source_df)
-        for season, stats in seasonal_stats.items():
-            report_lines.append(f"- {season}: Mean={stats['mean']:.2f}, Peak={stats['peak']:.2f}")
-        
-        report_content = "\n".join(report_lines)
+        # Generate comprehensive report from the already computed figures
+        generated_at = datetime.now()
+        report_header = f"# LOAD PROFILE SIMULATION REPORT\nGenerated: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        report_content = report_header + _build_report(
+            state_code,
+            int(st.session_state.source_df['timestamp'].iloc[0].year),
+            tuple(target_years),
+            analyzer.calculate_statistics(st.session_state.source_df),
+            st.session_state.sim_stats,
+            st.session_state.sim_validations,
+            analyzer.calculate_seasonal_patterns(st.session_state.source_df)
+        )
         
         st.text_area("Report Preview", report_content, height=400)
         
         st.download_button(
             label="📥 Download Full Report",
             data=report_content,
-            file_name=f"load_profile_analysis_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            file_name=f"load_profile_analysis_report_{generated_at.strftime('%Y%m%d_%H%M%S')}.txt",
             mime="text/plain"
         )
         
         # Export all data as Excel
         if st.button("📊 Export All Data to Excel"):
-            with pd.ExcelWriter('load_profile_analysis.xlsx', engine='openpyxl') as writer:
-                st.session_state.source_df.to_excel(writer, sheet_name='Source Data', index=False)
-                for year, df in st.session_state.results.items():
-                    df.to_excel(writer, sheet_name=f'Simulated {year}', index=False)
-            st.success("✅ Excel file created: load_profile_analysis.xlsx")
+            with st.spinner("Building Excel workbook..."):
+                excel_data = _excel_bytes(st.session_state.source_df, st.session_state.results)
+            st.download_button(
+                label="📥 Download Excel Workbook",
+                data=excel_data,
+                file_name="load_profile_analysis.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
     else:
         st.info("📋 Generate simulations first to create reports")
 
@@ -0,0 +1,29 @@
+"""Calendar fields of load profile timestamps, shared by the processor and the analysis tools"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict
+
+def wall_clock(timestamps: pd.Series) -> np.ndarray:
+    """Timestamps as naive datetime64 values of their local wall-clock time
+    
+    Tz-aware series are stripped of their zone, so calendar fields follow local time rather than UTC.
+    """
+    if isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+        timestamps = timestamps.dt.tz_localize(None)
+    return timestamps.to_numpy()
+
+def decompose_timestamps(timestamps: pd.Series) -> Dict[str, np.ndarray]:
+    """Split timestamps into int8 hour, month and day_of_week arrays of their local time
+    
+    Integer arithmetic on the epoch values instead of one pandas .dt pass per field.
+    """
+    timestamps = wall_clock(timestamps)
+    seconds = timestamps.astype('datetime64[s]').astype(np.int64)
+    days = timestamps.astype('datetime64[D]').astype(np.int64)
+    months = timestamps.astype('datetime64[M]').astype(np.int64)
+    return {
+        'hour': ((seconds // 3600) % 24).astype(np.int8),
+        'month': (months % 12 + 1).astype(np.int8),
+        'day_of_week': ((days + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday, Monday=0
+    }
@@ -1,11 +1,19 @@
 """Configuration for the load profile simulation tool"""
 
+import os
+from types import MappingProxyType
+
 # API endpoints
 HOLIDAY_API_URL = "https://get.api-feiertage.de"
 SCHOOL_HOLIDAY_API_URL = "https://ferien-api.de/api/v1/"
 
+# On-disk cache for holiday API responses, holiday tables rarely change within a day
+HTTP_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ferienplanung")
+HTTP_CACHE_TTL = 24 * 3600  # seconds
+HTTP_CACHE_TTL_PAST_YEARS = 30 * 24 * 3600  # holidays of past years no longer change
+
 # German federal states
-FEDERAL_STATES = {
+FEDERAL_STATES = MappingProxyType({
     "BW": "Baden-Württemberg",
     "BY": "Bayern", 
     "BE": "Berlin",
@@ -22,8 +30,12 @@ FEDERAL_STATES = {
     "ST": "Sachsen-Anhalt",
     "SH": "Schleswig-Holstein",
     "TH": "Thüringen"
-}
+})
+
+# State codes in display order, derived once at import
+STATE_CODES = tuple(FEDERAL_STATES)
 
 # Load profile settings
 INTERVALS_PER_DAY = 96  # 15-minute intervals
-INTERVAL_MINUTES = 15
\ No newline at end of file
+INTERVAL_MINUTES = 15
+INTERVALS_PER_HOUR = 60 // INTERVAL_MINUTES
\ No newline at end of file
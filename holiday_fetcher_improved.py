@@ -1,10 +1,27 @@
 """Improved module for fetching German holidays with fallback data"""
 
+import hashlib
+import json
+import os
+import re
+import threading
+import time
 import requests
-from datetime import datetime, date
-from typing import Dict, List, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
 import pandas as pd
-from config import HOLIDAY_API_URL, SCHOOL_HOLIDAY_API_URL
+from config import (FEDERAL_STATES, HOLIDAY_API_URL, SCHOOL_HOLIDAY_API_URL, HTTP_CACHE_DIR, HTTP_CACHE_TTL,
+                    HTTP_CACHE_TTL_PAST_YEARS)
+
+# Lower-case state names as they appear in API holiday names, e.g. "bayern"
+_STATE_NAMES = {code: name.lower() for code, name in FEDERAL_STATES.items()}
+
+# Zero-padded ISO date without a time part, the only input _parse_date takes a shortcut for
+_ISO_DATE_RE = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}')
 
 # Fallback holiday data for common German holidays
 FALLBACK_HOLIDAYS = {
@@ -19,14 +36,180 @@ FALLBACK_HOLIDAYS = {
     "2. Weihnachtstag": "12-26"
 }
 
+# Generated fallback data, shared across fetchers: year -> holidays, (year, state) -> school periods
+_fallback_cache: Dict[int, Dict[str, date]] = {}
+_typical_school_cache: Dict[Tuple[int, str], List[Tuple[date, date, str]]] = {}
+
+def _create_session() -> requests.Session:
+    """Shared keep-alive session, retrying transient gateway errors"""
+    session = requests.Session()
+    # Every request has a cached or computed fallback, so an unreachable or slow API fails
+    # straight away instead of paying extra timeouts; only quick gateway errors are retried
+    retries = Retry(total=2, connect=0, read=0, backoff_factor=0.3,
+                    status_forcelist=[502, 503, 504], allowed_methods=frozenset({'GET'}))
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries))
+    return session
+
+# One pooled session for all fetchers, so repeated calls reuse the TCP/TLS connection
+_SESSION = _create_session()
+
+def _cache_max_age(year: int) -> int:
+    """How long a cached response for a year's holidays stays fresh, in seconds"""
+    return HTTP_CACHE_TTL_PAST_YEARS if year < date.today().year else HTTP_CACHE_TTL
+
+def _read_cache_entry(cache_path: str) -> Optional[Dict]:
+    """Load a cached response entry, or None if it is missing or unreadable"""
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            entry = json.load(f)
+        return entry if isinstance(entry, dict) and 'data' in entry and 'fetched' in entry else None
+    except (OSError, ValueError):
+        return None
+
+def _write_cache_entry(cache_path: str, entry: Dict) -> None:
+    """Store a response entry, via a temporary file so concurrent readers never see a partial one"""
+    try:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not cache response in {cache_path}: {e}")
+
+def _get_json(url: str, timeout: float = 5, max_age: int = HTTP_CACHE_TTL):
+    """GET a JSON payload, served from the on-disk response cache while it is fresh
+    
+    Stale entries are revalidated with If-None-Match/If-Modified-Since, so an unchanged
+    resource costs a 304 instead of a download. If the API is unreachable, the stale copy is used.
+    """
+    cache_path = os.path.join(HTTP_CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+    entry = _read_cache_entry(cache_path)
+    if entry is not None and not entry.get('revalidate') and time.time() - entry['fetched'] < max_age:
+        return entry['data']
+    
+    headers = {}
+    if entry is not None:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    
+    try:
+        response = _SESSION.get(url, timeout=timeout, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            entry['fetched'] = time.time()
+            _write_cache_entry(cache_path, entry)
+            return entry['data']
+        response.raise_for_status()
+        data = response.json()
+    except (requests.RequestException, ValueError):
+        if entry is not None:
+            print(f"Using stale cached response for {url}")
+            return entry['data']
+        raise
+    
+    cache_control = response.headers.get('Cache-Control', '').lower()
+    if 'no-store' not in cache_control:
+        _write_cache_entry(cache_path, {
+            'fetched': time.time(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'revalidate': 'no-cache' in cache_control,
+            'data': data
+        })
+    return data
+
+@lru_cache(maxsize=256)
+def _easter(year: int) -> date:
+    """Calculate Easter Sunday using Gauss's Easter algorithm, memoized per year"""
+    a = year % 19
+    b = year // 100
+    c = year % 100
+    d = b // 4
+    e = b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i = c // 4
+    k = c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    n = (h + l - 7 * m + 114) // 31
+    p = (h + l - 7 * m + 114) % 31
+    return date(year, n, p + 1)
+
+@lru_cache(maxsize=64)
+def _week_labels(year: int) -> Dict[date, str]:
+    """ISO calendar week label ("KW<n>") for every day of a year, built in one vectorized pass"""
+    days = pd.date_range(date(year, 1, 1), date(year, 12, 31))
+    weeks = days.isocalendar().week.astype(int).tolist()
+    return {day: f"KW{week}" for day, week in zip(days.date, weeks)}
+
+@lru_cache(maxsize=2048)
+def _normalize_holiday_name(name: str, year: int, federal_state: str) -> str:
+    """Normalize holiday name to ensure consistent format (memoized, names repeat across calls)"""
+    # Convert to lowercase for consistency
+    name_lower = name.lower()
+    
+    state_name = _STATE_NAMES.get(federal_state, federal_state.lower())
+    
+    # Check if the name already contains the state and year
+    has_state = state_name in name_lower
+    has_year = str(year) in name
+    
+    # Build normalized name
+    if not has_state and not has_year:
+        # Name has neither state nor year (e.g., "Winterferien")
+        return f"{name_lower} {state_name} {year}"
+    elif not has_state:
+        # Has year but no state
+        return f"{name_lower.replace(str(year), '')} {state_name} {year}".strip()
+    elif not has_year:
+        # Has state but no year
+        return f"{name_lower} {year}"
+    else:
+        # Already has both
+        return name_lower
+
 class HolidayFetcher:
     def __init__(self, federal_state: str):
         self.federal_state = federal_state.upper()
         self.holidays_cache = {}
         self.school_holidays_cache = {}
+        self.special_days_cache = {}
+        self._caches_filled_at = time.monotonic()
+    
+    def _expire_caches(self) -> None:
+        """Forget in-memory holiday data older than HTTP_CACHE_TTL
+        
+        Long-lived fetchers, like the app's per-state processor, then go back to the response
+        cache, which decides per year whether the stored data is still fresh.
+        """
+        if time.monotonic() - self._caches_filled_at >= HTTP_CACHE_TTL:
+            self.holidays_cache.clear()
+            self.school_holidays_cache.clear()
+            self.special_days_cache.clear()
+            self._caches_filled_at = time.monotonic()
+    
+    def prefetch(self, years: Iterable[int]) -> None:
+        """Fetch public and school holidays for several years concurrently
+        
+        The API calls are independent, so waiting on them in parallel costs roughly
+        one round trip instead of two per year. Results land in the usual caches.
+        """
+        fetchers = [self.get_public_holidays, self.get_school_holidays]
+        tasks = [(fetch, year) for year in sorted(set(years)) for fetch in fetchers]
+        if not tasks:
+            return
+        
+        with ThreadPoolExecutor(max_workers=min(len(tasks), 8)) as executor:
+            for future in [executor.submit(fetch, year) for fetch, year in tasks]:
+                future.result()
     
     def get_public_holidays(self, year: int) -> Dict[str, date]:
         """Fetch public holidays with multiple fallback strategies"""
+        self._expire_caches()
         cache_key = f"{year}_{self.federal_state}"
         if cache_key in self.holidays_cache:
             return self.holidays_cache[cache_key]
@@ -53,10 +236,7 @@ class HolidayFetcher:
         # Try the simple API first
         try:
             url = f"https://date.nager.at/api/v3/publicholidays/{year}/DE"
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = _get_json(url, timeout=5, max_age=_cache_max_age(year))
             for holiday in data:
                 # Check if holiday applies to our state
                 counties = holiday.get('counties', [])
@@ -71,6 +251,9 @@ class HolidayFetcher:
     
     def _get_fallback_holidays(self, year: int) -> Dict[str, date]:
         """Generate basic holiday dates as fallback"""
+        if year in _fallback_cache:
+            return dict(_fallback_cache[year])
+        
         holidays = {}
         
         # Fixed date holidays
@@ -81,34 +264,21 @@ class HolidayFetcher:
         
         # Calculate Easter and related holidays
         easter = self._calculate_easter(year)
-        holidays["Karfreitag"] = easter - pd.Timedelta(days=2)
+        holidays["Karfreitag"] = easter - timedelta(days=2)
         holidays["Ostersonntag"] = easter
-        holidays["Ostermontag"] = easter + pd.Timedelta(days=1)
-        holidays["Christi Himmelfahrt"] = easter + pd.Timedelta(days=39)
-        holidays["Pfingstmontag"] = easter + pd.Timedelta(days=50)
+        holidays["Ostermontag"] = easter + timedelta(days=1)
+        holidays["Christi Himmelfahrt"] = easter + timedelta(days=39)
+        holidays["Pfingstmontag"] = easter + timedelta(days=50)
         
-        return holidays
+        _fallback_cache[year] = holidays
+        return dict(holidays)
     
-    def _calculate_easter(self, year: int) -> date:
-        """Calculate Easter Sunday using Gauss's Easter algorithm"""
-        a = year % 19
-        b = year // 100
-        c = year % 100
-        d = b // 4
-        e = b % 4
-        f = (b + 8) // 25
-        g = (b - f + 1) // 3
-        h = (19 * a + b - d - g + 15) % 30
-        i = c // 4
-        k = c % 4
-        l = (32 + 2 * e + 2 * i - h - k) % 7
-        m = (a + 11 * h + 22 * l) // 451
-        n = (h + l - 7 * m + 114) // 31
-        p = (h + l - 7 * m + 114) % 31
-        return date(year, n, p + 1)
+    # Pure function of the year, shared and cached across all fetchers
+    _calculate_easter = staticmethod(_easter)
     
     def get_school_holidays(self, year: int) -> List[Tuple[date, date, str]]:
         """Get school holidays with fallback to typical periods"""
+        self._expire_caches()
         cache_key = f"{year}_{self.federal_state}"
         if cache_key in self.school_holidays_cache:
             return self.school_holidays_cache[cache_key]
@@ -144,23 +314,20 @@ class HolidayFetcher:
             state_code = state_map.get(self.federal_state, self.federal_state)
             url = f"https://ferien-api.de/api/v1/holidays/{state_code}/{year}"
             
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
+            data = _get_json(url, timeout=5, max_age=_cache_max_age(year))
+            for holiday in data:
+                start_str = holiday.get('start', '')
+                end_str = holiday.get('end', '')
+                name = holiday.get('name', 'Schulferien')
                 
-                for holiday in data:
-                    start_str = holiday.get('start', '')
-                    end_str = holiday.get('end', '')
-                    name = holiday.get('name', 'Schulferien')
-                    
-                    # Parse dates with multiple format attempts
-                    start = self._parse_date(start_str)
-                    end = self._parse_date(end_str)
-                    
-                    if start and end:
-                        # Normalize holiday name to include state and year for consistency
-                        normalized_name = self._normalize_holiday_name(name, year)
-                        holidays.append((start, end, normalized_name))
+                # Parse dates with multiple format attempts
+                start = self._parse_date(start_str)
+                end = self._parse_date(end_str)
+                
+                if start and end:
+                    # Normalize holiday name to include state and year for consistency
+                    normalized_name = self._normalize_holiday_name(name, year)
+                    holidays.append((start, end, normalized_name))
                         
         except Exception as e:
             print(f"API error: {e}")
@@ -169,53 +336,19 @@ class HolidayFetcher:
     
     def _normalize_holiday_name(self, name: str, year: int) -> str:
         """Normalize holiday name to ensure consistent format"""
-        # Convert to lowercase for consistency
-        name_lower = name.lower()
-        
-        # Map state codes to full names
-        state_names = {
-            'BW': 'baden-württemberg',
-            'BY': 'bayern',
-            'BE': 'berlin',
-            'BB': 'brandenburg',
-            'HB': 'bremen',
-            'HH': 'hamburg',
-            'HE': 'hessen',
-            'MV': 'mecklenburg-vorpommern',
-            'NI': 'niedersachsen',
-            'NW': 'nordrhein-westfalen',
-            'RP': 'rheinland-pfalz',
-            'SL': 'saarland',
-            'SN': 'sachsen',
-            'ST': 'sachsen-anhalt',
-            'SH': 'schleswig-holstein',
-            'TH': 'thüringen'
-        }
-        
-        state_name = state_names.get(self.federal_state, self.federal_state.lower())
-        
-        # Check if the name already contains the state and year
-        has_state = state_name in name_lower
-        has_year = str(year) in name
-        
-        # Build normalized name
-        if not has_state and not has_year:
-            # Name has neither state nor year (e.g., "Winterferien")
-            return f"{name_lower} {state_name} {year}"
-        elif not has_state:
-            # Has year but no state
-            return f"{name_lower.replace(str(year), '')} {state_name} {year}".strip()
-        elif not has_year:
-            # Has state but no year
-            return f"{name_lower} {year}"
-        else:
-            # Already has both
-            return name_lower
+        return _normalize_holiday_name(name, year, self.federal_state)
     
     def _parse_date(self, date_str: str) -> date:
         """Parse date string with multiple format attempts"""
         if not date_str:
             return None
+        
+        # Fast path for plain 'YYYY-MM-DD' only; date-times keep the exact formats below
+        if isinstance(date_str, str) and _ISO_DATE_RE.fullmatch(date_str):
+            try:
+                return date.fromisoformat(date_str)
+            except ValueError:
+                return None
             
         formats = [
             '%Y-%m-%d',
@@ -234,6 +367,10 @@ class HolidayFetcher:
     
     def _get_typical_school_holidays(self, year: int) -> List[Tuple[date, date, str]]:
         """Generate typical school holiday periods as fallback"""
+        cache_key = (year, self.federal_state)
+        if cache_key in _typical_school_cache:
+            return list(_typical_school_cache[cache_key])
+        
         holidays = []
         
         # Typical German school holiday periods (approximate)
@@ -244,11 +381,11 @@ class HolidayFetcher:
         # Easter holidays (around Easter)
         easter = self._calculate_easter(year)
         name = self._normalize_holiday_name("Osterferien", year)
-        holidays.append((easter - pd.Timedelta(days=7), easter + pd.Timedelta(days=7), name))
+        holidays.append((easter - timedelta(days=7), easter + timedelta(days=7), name))
         
         # Whitsun holidays (around Pentecost)
         name = self._normalize_holiday_name("Pfingstferien", year)
-        holidays.append((easter + pd.Timedelta(days=49), easter + pd.Timedelta(days=56), name))
+        holidays.append((easter + timedelta(days=49), easter + timedelta(days=56), name))
         
         # Summer holidays (July-August, varies by state)
         name = self._normalize_holiday_name("Sommerferien", year)
@@ -269,46 +406,73 @@ class HolidayFetcher:
         if year < 2100:  # Avoid going into next year for last year
             holidays.append((date(year + 1, 1, 1), date(year + 1, 1, 6), name))
         
-        return holidays
+        _typical_school_cache[cache_key] = holidays
+        return list(holidays)
     
     def get_weekends(self, year: int) -> List[Tuple[date, date, int]]:
         """Get all weekends (Saturday-Sunday) for a year with week number"""
-        weekends = []
-        current_date = date(year, 1, 1)
-        
-        # Find first Saturday
-        while current_date.weekday() != 5:  # 5 = Saturday
-            current_date = pd.Timestamp(current_date) + pd.Timedelta(days=1)
-            current_date = current_date.date()
-        
-        # Collect all weekends
-        while current_date.year == year:
-            sunday = pd.Timestamp(current_date) + pd.Timedelta(days=1)
-            if sunday.year == year:
-                week_num = current_date.isocalendar()[1]
-                weekends.append((current_date, sunday.date(), week_num))
-            current_date = pd.Timestamp(current_date) + pd.Timedelta(days=7)
-            current_date = current_date.date()
-        
-        return weekends
+        # All Saturdays whose Sunday still falls in the year (Dec 31 excluded)
+        saturdays = pd.date_range(date(year, 1, 1), date(year, 12, 30), freq='W-SAT')
+        sundays = saturdays + timedelta(days=1)
+        week_numbers = saturdays.isocalendar().week.astype(int).tolist()
+        
+        return list(zip(saturdays.date, sundays.date, week_numbers))
+    
+    def _get_special_days(self, year: int) -> Dict[date, Tuple[str, str]]:
+        """Map every public and school holiday date of a year to its category and name"""
+        self._expire_caches()
+        cache_key = f"{year}_{self.federal_state}"
+        if cache_key in self.special_days_cache:
+            return self.special_days_cache[cache_key]
+        
+        special_days = {}
+        
+        # Public holidays take precedence, the first listed holiday wins a shared date
+        for holiday_name, holiday_date in self.get_public_holidays(year).items():
+            special_days.setdefault(holiday_date, ("public_holiday", holiday_name))
+        
+        # Expand school holiday periods day by day, earlier periods win overlaps
+        for start, end, name in self.get_school_holidays(year):
+            for offset in range((end - start).days + 1):
+                special_days.setdefault(start + timedelta(days=offset), ("school_holiday", name))
+        
+        self.special_days_cache[cache_key] = special_days
+        return special_days
     
     def categorize_date(self, check_date: date, year: int) -> Tuple[str, str]:
         """Categorize a date as holiday, school holiday, weekend, or normal day"""
-        # Check public holidays
-        holidays = self.get_public_holidays(year)
-        for holiday_name, holiday_date in holidays.items():
-            if check_date == holiday_date:
-                return "public_holiday", holiday_name
-        
-        # Check school holidays
-        school_holidays = self.get_school_holidays(year)
-        for start, end, name in school_holidays:
-            if start <= check_date <= end:
-                return "school_holiday", name
+        # Public and school holidays via the per-year lookup table
+        special_day = self._get_special_days(year).get(check_date)
+        if special_day is not None:
+            return special_day
         
         # Check weekends
-        if check_date.weekday() in [5, 6]:  # Saturday or Sunday
-            week_num = check_date.isocalendar()[1]
-            return "weekend", f"KW{week_num}"
+        if check_date.weekday() >= 5:  # Saturday or Sunday
+            return "weekend", _week_labels(check_date.year)[check_date]
+        
+        return "normal", "Normal day"
+    
+    def categorize_dates(self, dates: Iterable[date], year: int) -> List[Tuple[str, str]]:
+        """Categorize many dates at once, same result as categorize_date for each of them"""
+        index = pd.DatetimeIndex(list(dates))
+        special_days = self._get_special_days(year)
+        
+        # Weekday and ISO week for the whole index in one go instead of per date
+        is_weekend = (index.weekday >= 5).tolist()
+        week_numbers = index.isocalendar().week.astype(int).tolist()
         
-        return "normal", "Normal day"
\ No newline at end of file
+        categories = []
+        for day, weekend, week_num in zip(index.date, is_weekend, week_numbers):
+            special_day = special_days.get(day)
+            if special_day is not None:
+                categories.append(special_day)
+            elif weekend:
+                categories.append(("weekend", f"KW{week_num}"))
+            else:
+                categories.append(("normal", "Normal day"))
+        return categories
+    
+    def categorize_year(self, year: int) -> Tuple[List[date], List[Tuple[str, str]]]:
+        """Every day of a year in order, together with its categorize_date result"""
+        days = list(pd.date_range(date(year, 1, 1), date(year, 12, 31)).date)
+        return days, self.categorize_dates(days, year)
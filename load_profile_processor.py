@@ -1,13 +1,37 @@
 """Module for processing and mapping load profiles"""
 
+import io
 import pandas as pd
 import numpy as np
 import re
-from datetime import datetime, timedelta, date
-from typing import List, Dict, Tuple, Optional
+from collections import defaultdict
+from datetime import timedelta, date
+from typing import IO, List, Dict, Tuple, Optional, Union
 from config import INTERVALS_PER_DAY, INTERVAL_MINUTES
+from calendar_fields import decompose_timestamps, wall_clock
 from holiday_fetcher_improved import HolidayFetcher
 
+# Year numbers inside holiday names, stripped so names match across years
+_YEAR_RE = re.compile(r'\s*\d{4}\s*')
+
+# Calendar week number in weekend descriptions such as "KW12"
+_WEEK_RE = re.compile(r'KW(\d+)')
+
+def _nearest_day_of_year(doys: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """For every day of year 0..366, the index of the closest entry in doys
+    
+    Entries are sorted by (doy, position); ties go to the lowest position, as with a linear scan.
+    """
+    days = np.arange(367)
+    after = np.searchsorted(doys, days)
+    # First entry of the closest day of year before each day, if there is one
+    before = np.searchsorted(doys, doys[np.maximum(after - 1, 0)])
+    after = np.minimum(after, len(doys) - 1)
+    before_diff = np.abs(doys[before] - days)
+    after_diff = np.abs(doys[after] - days)
+    use_before = (before_diff < after_diff) | ((before_diff == after_diff) & (positions[before] <= positions[after]))
+    return np.where(use_before, before, after)
+
 class LoadProfileProcessor:
     def __init__(self, federal_state: str):
         self.federal_state = federal_state
@@ -15,48 +39,89 @@ class LoadProfileProcessor:
         self.source_profile = None
         self.source_year = None
     
-    def parse_load_profile(self, csv_content: str) -> pd.DataFrame:
-        """Parse CSV load profile with timestamp and load columns"""
-        lines = csv_content.strip().split('\n')
-        data = []
+    def parse_load_profile(self, csv_content: Union[str, bytes, IO]) -> pd.DataFrame:
+        """Parse CSV load profile with timestamp and load columns
         
-        for line in lines[1:]:  # Skip header
-            parts = line.strip().split(';')
-            if len(parts) >= 2:
-                timestamp_str = parts[0]
-                load_str = parts[1].replace(',', '.')  # Handle German decimal separator
-                
-                try:
-                    timestamp = pd.to_datetime(timestamp_str)
-                    load = float(load_str)
-                    data.append({'timestamp': timestamp, 'load': load})
-                except (ValueError, pd.errors.ParserError):
-                    continue
+        Accepts the CSV text, raw bytes or a file-like object such as a Streamlit upload.
+        """
+        if isinstance(csv_content, str):
+            csv_content = io.StringIO(csv_content)
+        elif isinstance(csv_content, bytes):
+            csv_content = io.BytesIO(csv_content)
         
-        df = pd.DataFrame(data)
+        # Let the C parser handle splitting and the German decimal separator
+        df = pd.read_csv(
+            csv_content, sep=';', decimal=',', header=0, usecols=[0, 1],
+            names=['timestamp', 'load'], dtype={'timestamp': str},
+            on_bad_lines='skip', engine='c'
+        )
+        
+        # Malformed load values leave the column as text, convert what is parseable
+        if not pd.api.types.is_numeric_dtype(df['load']):
+            df['load'] = pd.to_numeric(df['load'].str.replace(',', '.', regex=False), errors='coerce')
+        
+        timestamps = pd.to_datetime(df['timestamp'], format='ISO8601', errors='coerce')
+        unparsed = timestamps.isna() & df['timestamp'].notna()
+        if unparsed.any():
+            # Fall back to flexible parsing for rows not in ISO format
+            timestamps[unparsed] = pd.to_datetime(df.loc[unparsed, 'timestamp'], format='mixed', errors='coerce')
+        df['timestamp'] = timestamps
+        
+        return self.load_dataframe(df)
+    
+    def load_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Prepare an in-memory timestamp/load frame the same way parse_load_profile does
+        
+        Lets callers that already hold the data skip the CSV round trip.
+        """
+        df = df[['timestamp', 'load']].dropna()
+        if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df['load'] = df['load'].astype(np.float64)
         df = df.sort_values('timestamp').reset_index(drop=True)
         
         # Extract year from first timestamp
         if not df.empty:
             self.source_year = df['timestamp'].iloc[0].year
+            
+            # Cache calendar fields once so the analysis tools don't re-derive them
+            for field, values in decompose_timestamps(df['timestamp']).items():
+                df[field] = values
+            df['is_weekend'] = df['day_of_week'] >= 5
         
         return df
     
-    def chunk_by_days(self, df: pd.DataFrame) -> Dict[date, pd.DataFrame]:
-        """Split load profile into daily chunks of 96 intervals"""
+    def chunk_by_days(self, df: pd.DataFrame) -> Dict[date, np.ndarray]:
+        """Split load profile into daily chunks of 96 interval loads"""
         daily_chunks = {}
         
-        # Group by date
-        df['date'] = df['timestamp'].dt.date
+        # Local wall-clock values, so tz-aware input splits on local days as well
+        timestamps = wall_clock(df['timestamp'])
+        loads = df['load'].to_numpy()
+        
+        # A gapless series starting at midnight is already day-major, so it splits with one reshape
+        n_days = len(timestamps) // INTERVALS_PER_DAY
+        if n_days and len(timestamps) == n_days * INTERVALS_PER_DAY:
+            first_day = timestamps[0].astype('datetime64[D]')
+            expected = first_day + np.arange(len(timestamps)) * np.timedelta64(INTERVAL_MINUTES, 'm')
+            if np.array_equal(timestamps, expected):
+                days = first_day + np.arange(n_days)
+                return dict(zip(days.tolist(), loads.reshape(n_days, INTERVALS_PER_DAY)))
+        
+        # Group by native datetime64 keys of the local calendar day, without a column of date objects
+        day_keys = timestamps.astype('datetime64[D]')
+        days, day_index, counts = np.unique(day_keys, return_inverse=True, return_counts=True)
+        loads = loads[np.argsort(day_index, kind='stable')]
+        starts = np.cumsum(counts) - counts
         
-        for day, group in df.groupby('date'):
-            # Ensure we have 96 intervals
-            if len(group) == INTERVALS_PER_DAY:
-                daily_chunks[day] = group[['timestamp', 'load']].copy()
+        # Ensure we have 96 intervals
+        complete = (counts == INTERVALS_PER_DAY) & ~np.isnat(days)
+        for day, start in zip(days[complete].tolist(), starts[complete].tolist()):
+            daily_chunks[day] = loads[start:start + INTERVALS_PER_DAY]
         
         return daily_chunks
     
-    def categorize_days(self, daily_chunks: Dict[date, pd.DataFrame]) -> Dict[str, List[Tuple[date, pd.DataFrame, str]]]:
+    def categorize_days(self, daily_chunks: Dict[date, np.ndarray]) -> Dict[str, List[Tuple[date, np.ndarray, str]]]:
         """Categorize each day's load profile by type"""
         categorized = {
             'public_holiday': [],
@@ -65,27 +130,74 @@ class LoadProfileProcessor:
             'normal': []
         }
         
+        # Categorize all days of each source year in one batch
+        days_by_year = defaultdict(list)
+        for day in daily_chunks:
+            days_by_year[day.year].append(day)
+        day_categories = {}
+        for year, days in days_by_year.items():
+            day_categories.update(zip(days, self.holiday_fetcher.categorize_dates(days, year)))
+        
         for day, chunk in daily_chunks.items():
-            category, description = self.holiday_fetcher.categorize_date(day, day.year)
+            category, description = day_categories[day]
             categorized[category].append((day, chunk, description))
         
         return categorized
     
     def map_to_future_year(self, categorized_source: Dict, target_year: int) -> pd.DataFrame:
         """Map categorized load profiles to matching days in target year"""
-        result_data = []
+        # Chosen source day per mapped target day, assembled into columns at the end
+        mapped_days = []
+        mapped_loads = []
+        mapped_sources = []
         
-        # Get target year structure
-        target_holidays = self.holiday_fetcher.get_public_holidays(target_year)
-        target_school_holidays = self.holiday_fetcher.get_school_holidays(target_year)
-        target_weekends = self.holiday_fetcher.get_weekends(target_year)
+        # Get target year structure, every day of the year categorized in one batch
+        target_days, target_categories = self.holiday_fetcher.categorize_year(target_year)
         
-        # Create mapping for each day in target year
-        current_date = date(target_year, 1, 1)
-        end_date = date(target_year, 12, 31)
+        # Bucket source holidays by year-stripped name once, so each target day is a dict lookup.
+        # Names are normalized in one vectorized pass and every bucket is kept in date order.
+        source_by_name = {}
+        for category in ('public_holiday', 'school_holiday'):
+            names = pd.Series([src_desc for _, _, src_desc in categorized_source[category]], dtype=str)
+            names = names.str.replace(_YEAR_RE, '', regex=True).str.strip().str.lower()
+            buckets = defaultdict(list)
+            for entry, name in zip(categorized_source[category], names):
+                buckets[name].append(entry)
+            for bucket in buckets.values():
+                bucket.sort(key=lambda x: x[0])
+            source_by_name[category] = buckets
+        
+        # Index source weekend days by (calendar week, weekday) and by weekday alone,
+        # keeping the first day in source order for each key
+        weekend_by_week = {}
+        weekend_by_weekday = {}
+        for entry in categorized_source['weekend']:
+            src_date, _, src_desc = entry
+            week_match = _WEEK_RE.search(src_desc)
+            if week_match:
+                weekend_by_week.setdefault((int(week_match.group(1)), src_date.weekday()), entry)
+            weekend_by_weekday.setdefault(src_date.weekday(), entry)
+        
+        # Source normal days per weekday, with the nearest one for every day of year resolved up front.
+        # The source position breaks ties so the earliest listed day wins, as in a linear scan.
+        normal_by_weekday = defaultdict(list)
+        for position, (src_date, chunk, _) in enumerate(categorized_source['normal']):
+            normal_by_weekday[src_date.weekday()].append((src_date.timetuple().tm_yday, position, src_date, chunk))
+        for weekday, entries in normal_by_weekday.items():
+            entries.sort(key=lambda x: x[:2])
+            doys, positions = np.array([entry[:2] for entry in entries]).T
+            normal_by_weekday[weekday] = (_nearest_day_of_year(doys, positions).tolist(), entries)
         
-        while current_date <= end_date:
-            category, description = self.holiday_fetcher.categorize_date(current_date, target_year)
+        # First day of the current run of identically categorized days, which is where a
+        # holiday period starts. A run may reach back to Dec 31 of the previous year.
+        run_start = target_days[0] - timedelta(days=1)
+        run_key = self.holiday_fetcher.categorize_date(run_start, target_year)
+        
+        # Create mapping for each day in target year
+        for current_date, (category, description) in zip(target_days, target_categories):
+            if (category, description) != run_key:
+                run_key = (category, description)
+                run_start = current_date
             
             # Find matching source profile
             source_chunk = None
@@ -93,37 +205,19 @@ class LoadProfileProcessor:
             
             if category == 'public_holiday':
                 # Try to find same holiday in source with position matching
-                matching_holidays = []
                 # For public holidays, match by name (they don't have years typically)
-                for src_date, chunk, src_desc in categorized_source['public_holiday']:
-                    # Remove any potential year information for better matching
-                    target_name = re.sub(r'\s*\d{4}\s*', '', description).strip().lower()
-                    source_name = re.sub(r'\s*\d{4}\s*', '', src_desc).strip().lower()
-                    if source_name == target_name:
-                        matching_holidays.append((src_date, chunk, src_desc))
+                # Remove any potential year information for better matching
+                target_name = _YEAR_RE.sub('', description).strip().lower()
+                matching_holidays = source_by_name['public_holiday'].get(target_name, [])
                 
                 if matching_holidays:
-                    # Sort by date to maintain order
-                    matching_holidays.sort(key=lambda x: x[0])
-                    
                     # For most public holidays, there's only one day, but handle multi-day cases
                     if len(matching_holidays) == 1:
                         src_date, source_chunk, src_desc = matching_holidays[0]
                         source_info = f"Holiday: {description} from {src_date}"
                     else:
                         # Multi-day public holiday - find position within period
-                        holiday_start = current_date
-                        check_date = current_date
-                        while check_date >= date(target_year, 1, 1):
-                            prev_date = pd.Timestamp(check_date) - pd.Timedelta(days=1)
-                            prev_date = prev_date.date()
-                            prev_cat, prev_desc = self.holiday_fetcher.categorize_date(prev_date, target_year)
-                            if prev_cat != 'public_holiday' or prev_desc != description:
-                                break
-                            holiday_start = prev_date
-                            check_date = prev_date
-                        
-                        day_position = (current_date - holiday_start).days
+                        day_position = (current_date - run_start).days
                         idx = day_position % len(matching_holidays)
                         src_date, source_chunk, src_desc = matching_holidays[idx]
                         source_info = f"Holiday: {description} from {src_date} (day {day_position + 1})"
@@ -139,35 +233,15 @@ class LoadProfileProcessor:
             
             elif category == 'school_holiday':
                 # Match by holiday type AND position within holiday period
-                # First, collect all matching holidays by type
-                matching_holidays = []
+                # First, collect all matching holidays by type (already in date order)
                 # Remove year from descriptions for better matching
-                target_type = re.sub(r'\s*\d{4}\s*', '', description).strip().lower()
-                
-                for src_date, chunk, src_desc in categorized_source['school_holiday']:
-                    source_type = re.sub(r'\s*\d{4}\s*', '', src_desc).strip().lower()
-                    if source_type == target_type:
-                        matching_holidays.append((src_date, chunk, src_desc))
+                target_type = _YEAR_RE.sub('', description).strip().lower()
+                matching_holidays = source_by_name['school_holiday'].get(target_type, [])
                 
                 if matching_holidays:
-                    # Sort by date to maintain order within holiday period
-                    matching_holidays.sort(key=lambda x: x[0])
-                    
-                    # Calculate position within target holiday period
-                    # Find start of target holiday period by checking backwards
-                    holiday_start = current_date
-                    check_date = current_date
-                    while check_date >= date(target_year, 1, 1):
-                        prev_date = pd.Timestamp(check_date) - pd.Timedelta(days=1)
-                        prev_date = prev_date.date()
-                        prev_cat, prev_desc = self.holiday_fetcher.categorize_date(prev_date, target_year)
-                        if prev_cat != 'school_holiday' or prev_desc != description:
-                            break
-                        holiday_start = prev_date
-                        check_date = prev_date
-                    
-                    # Calculate day position within holiday (0-based)
-                    day_position = (current_date - holiday_start).days
+                    # Calculate day position within target holiday period (0-based),
+                    # counted from the start of the current run instead of walking back
+                    day_position = (current_date - run_start).days
                     
                     # Use modulo to cycle through available source days if needed
                     if day_position < len(matching_holidays):
@@ -193,20 +267,11 @@ class LoadProfileProcessor:
                 week_num = current_date.isocalendar()[1]
                 target_weekday = current_date.weekday()  # 5=Saturday, 6=Sunday
                 
-                # First try: exact week and weekday match
-                for src_date, chunk, src_desc in categorized_source['weekend']:
-                    if f"KW{week_num}" in src_desc and src_date.weekday() == target_weekday:
-                        source_chunk = chunk
-                        source_info = f"Weekend {src_desc} from {src_date}"
-                        break
-                
-                # Second try: same weekday from any week
-                if source_chunk is None:
-                    for src_date, chunk, src_desc in categorized_source['weekend']:
-                        if src_date.weekday() == target_weekday:
-                            source_chunk = chunk
-                            source_info = f"Weekend {src_desc} from {src_date}"
-                            break
+                # First try: exact week and weekday match, then same weekday from any week
+                match = weekend_by_week.get((week_num, target_weekday)) or weekend_by_weekday.get(target_weekday)
+                if match is not None:
+                    src_date, source_chunk, src_desc = match
+                    source_info = f"Weekend {src_desc} from {src_date}"
                 
                 # Fallback to any weekend (maintain original fallback behavior)
                 if source_chunk is None and categorized_source['weekend']:
@@ -221,43 +286,39 @@ class LoadProfileProcessor:
                 target_doy = current_date.timetuple().tm_yday
                 target_dow = current_date.weekday()
                 
-                best_match = None
-                best_diff = float('inf')
-                
-                for src_date, chunk, _ in categorized_source['normal']:
-                    src_doy = src_date.timetuple().tm_yday
-                    src_dow = src_date.weekday()
-                    
-                    if src_dow == target_dow:
-                        diff = abs(src_doy - target_doy)
-                        if diff < best_diff:
-                            best_diff = diff
-                            best_match = (src_date, chunk)
-                
-                if best_match:
-                    source_chunk = best_match[1]
-                    source_info = f"Normal day from {best_match[0]}"
+                if target_dow in normal_by_weekday:
+                    nearest, entries = normal_by_weekday[target_dow]
+                    _, _, src_date, source_chunk = entries[nearest[target_doy]]
+                    source_info = f"Normal day from {src_date}"
             
             # Apply the chunk to target date
             if source_chunk is not None:
-                for i in range(INTERVALS_PER_DAY):
-                    timestamp = datetime.combine(current_date, datetime.min.time()) + timedelta(minutes=i * INTERVAL_MINUTES)
-                    load = source_chunk.iloc[i % len(source_chunk)]['load']
-                    result_data.append({
-                        'timestamp': timestamp,
-                        'load': load,
-                        'source': source_info
-                    })
-            
-            current_date = pd.Timestamp(current_date) + pd.Timedelta(days=1)
-            current_date = current_date.date()
+                mapped_days.append(current_date)
+                mapped_loads.append(source_chunk)
+                mapped_sources.append(source_info)
+        
+        if not mapped_days:
+            return pd.DataFrame()
         
-        return pd.DataFrame(result_data)
+        # Every mapped day contributes INTERVALS_PER_DAY rows starting at midnight
+        offsets = np.arange(INTERVALS_PER_DAY) * np.timedelta64(INTERVAL_MINUTES, 'm')
+        timestamps = (np.array(mapped_days, dtype='datetime64[D]')[:, None] + offsets).ravel()
+        
+        # A few hundred distinct source notes repeat over ~35k rows, store them as codes
+        sources = pd.Categorical(mapped_sources)
+        return pd.DataFrame({
+            'timestamp': timestamps.astype('datetime64[us]'),
+            'load': np.concatenate(mapped_loads).astype(np.float64, copy=False),
+            'source': pd.Categorical.from_codes(np.repeat(sources.codes, INTERVALS_PER_DAY), sources.categories)
+        })
     
     def generate_future_profiles(self, source_df: pd.DataFrame, target_years: List[int]) -> Dict[int, pd.DataFrame]:
         """Generate load profiles for multiple future years"""
         # Chunk source data
         daily_chunks = self.chunk_by_days(source_df)
+        
+        # Fetch every year's holidays up front, in parallel rather than one API call at a time
+        self.holiday_fetcher.prefetch({day.year for day in daily_chunks} | set(target_years))
         categorized_source = self.categorize_days(daily_chunks)
         
         # Generate for each target year
@@ -267,18 +328,14 @@ class LoadProfileProcessor:
         
         return results
     
-    def export_to_csv(self, df: pd.DataFrame, include_source: bool = True) -> str:
+    @staticmethod
+    def export_to_csv(df: pd.DataFrame, include_source: bool = True) -> str:
         """Export DataFrame to CSV format with optional source annotations"""
-        lines = ['timestamp;load' + (';source' if include_source else '')]
-        
-        for _, row in df.iterrows():
-            timestamp_str = row['timestamp'].strftime('%Y-%m-%d %H:%M')
-            load_str = f"{row['load']:.2f}".replace('.', ',')  # German decimal separator
-            
-            if include_source:
-                source = row.get('source', '')
-                lines.append(f"{timestamp_str};{load_str};{source}")
-            else:
-                lines.append(f"{timestamp_str};{load_str}")
+        columns = ['timestamp', 'load'] + (['source'] if include_source else [])
         
-        return '\n'.join(lines)
\ No newline at end of file
+        # Serialize with pandas' C writer; missing sources become empty fields
+        csv_content = df.reindex(columns=columns).to_csv(
+            sep=';', decimal=',', float_format='%.2f', date_format='%Y-%m-%d %H:%M',
+            index=False, lineterminator='\n'
+        )
+        return csv_content.rstrip('\n')
\ No newline at end of file
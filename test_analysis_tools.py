@@ -0,0 +1,42 @@
+"""Tests for the analyzer's memoized results"""
+
+import numpy as np
+import pandas as pd
+
+from analysis_tools import LoadProfileAnalyzer
+
+
+def _profile() -> pd.DataFrame:
+    timestamps = pd.date_range('2024-01-01', periods=7 * 96, freq='15min')
+    return pd.DataFrame({'timestamp': timestamps, 'load': np.linspace(100.0, 200.0, len(timestamps))})
+
+
+def test_statistics_follow_in_place_edits():
+    analyzer = LoadProfileAnalyzer()
+    df = _profile()
+    assert analyzer.calculate_statistics(df)['max'] == 200.0
+    
+    df.loc[0, 'load'] = 500.0
+    assert analyzer.calculate_statistics(df)['max'] == 500.0
+
+
+def test_memoized_results_are_not_shared_with_callers():
+    analyzer = LoadProfileAnalyzer()
+    df = _profile()
+    analyzer.calculate_seasonal_patterns(df)['Winter']['mean'] = -1.0
+    
+    assert analyzer.calculate_seasonal_patterns(df.copy())['Winter']['mean'] == 150.0
+
+
+def test_anomalies_match_plain_z_scores_on_low_variance_load():
+    # A tiny spread on a large offset is where a sum-of-squares variance cancels out
+    timestamps = pd.date_range('2024-01-01', periods=35136, freq='15min')
+    load = 3e6 + np.random.default_rng(0).normal(0.0, 0.01, len(timestamps))
+    df = pd.DataFrame({'timestamp': timestamps, 'load': load})
+    
+    expected = np.abs((load - load.mean()) / load.std())
+    anomalies = LoadProfileAnalyzer().detect_anomalies(df)
+    
+    assert len(anomalies) > 0
+    np.testing.assert_array_equal(anomalies.index, np.flatnonzero(expected > 3.0))
+    np.testing.assert_allclose(anomalies['z_score'], expected[expected > 3.0], rtol=1e-9)
@@ -0,0 +1,49 @@
+"""Tests for the holiday fetcher's in-memory caches and date parsing"""
+
+from datetime import date
+
+import pytest
+
+import holiday_fetcher_improved
+from config import HTTP_CACHE_TTL
+from holiday_fetcher_improved import HolidayFetcher
+
+
+def test_holiday_caches_expire_with_the_http_cache_ttl(monkeypatch):
+    requested = []
+    
+    def offline(url, *args, **kwargs):
+        requested.append(url)
+        raise ConnectionError("offline")
+    monkeypatch.setattr(holiday_fetcher_improved, '_get_json', offline)
+    
+    now = [1000.0]
+    monkeypatch.setattr(holiday_fetcher_improved.time, 'monotonic', lambda: now[0])
+    fetcher = HolidayFetcher('BW')
+    
+    fetcher.get_public_holidays(2026)
+    fetcher.get_public_holidays(2026)
+    assert len(requested) == 1
+    
+    now[0] += HTTP_CACHE_TTL
+    fetcher.get_public_holidays(2026)
+    assert len(requested) == 2
+
+
+@pytest.mark.parametrize('date_str, expected', [
+    ('2024-03-25', date(2024, 3, 25)),
+    ('2024-3-5', date(2024, 3, 5)),
+    ('2024-03-25T00:00:00', date(2024, 3, 25)),
+    ('2024-03-25T00:00:00Z', date(2024, 3, 25)),
+    ('2024-03-25T00:00:00+0100', date(2024, 3, 25)),
+    ('2024-03-25T00:00:00+01:00', date(2024, 3, 25)),
+    # Formats the original strptime list never accepted stay rejected
+    ('2024-03-25T00:00', None),
+    ('2024-03-25T00:00Z', None),
+    ('2024-03-25Tlater', None),
+    ('2024-W13-1', None),
+    ('2024-02-30', None),
+    ('', None),
+])
+def test_parse_date_accepts_exactly_the_listed_formats(date_str, expected):
+    assert HolidayFetcher('BW')._parse_date(date_str) == expected
@@ -0,0 +1,125 @@
+"""Tests for day chunking and mapping of load profiles"""
+
+from datetime import date
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from load_profile_processor import LoadProfileProcessor, _nearest_day_of_year
+
+
+def _profile(start: str, periods: int, tz: str = None) -> pd.DataFrame:
+    timestamps = pd.date_range(start, periods=periods, freq='15min', tz=tz)
+    return pd.DataFrame({'timestamp': timestamps, 'load': np.arange(periods, dtype=np.float64)})
+
+
+def test_chunk_by_days_groups_tz_aware_input_by_local_date():
+    # March in Berlin: the DST switch on the 31st leaves that day with 92 intervals
+    df = _profile('2024-03-01', 31 * 96 - 4 + 5, tz='Europe/Berlin')
+    chunks = LoadProfileProcessor('BW').chunk_by_days(df)
+    
+    local_dates = df['timestamp'].dt.date
+    assert list(chunks) == [date(2024, 3, day) for day in range(1, 31)]
+    for day, chunk in chunks.items():
+        np.testing.assert_array_equal(chunk, df.loc[local_dates == day, 'load'].to_numpy())
+
+
+def test_chunk_by_days_reshapes_tz_aware_year():
+    df = _profile('2024-01-01T00:00:00+01:00', 366 * 96)
+    chunks = LoadProfileProcessor('BW').chunk_by_days(df)
+    
+    assert len(chunks) == 366
+    assert next(iter(chunks)) == date(2024, 1, 1)
+    np.testing.assert_array_equal(chunks[date(2024, 1, 1)], np.arange(96))
+
+
+def test_generate_future_profiles_accepts_tz_aware_profile(monkeypatch):
+    def offline(*args, **kwargs):
+        raise ConnectionError("offline")
+    monkeypatch.setattr('holiday_fetcher_improved._get_json', offline)
+    
+    timestamps = pd.date_range('2024-01-01', periods=366 * 96, freq='15min')
+    csv = "timestamp;load\n" + "\n".join(f"{t:%Y-%m-%dT%H:%M:%S}+01:00;{i},5" for i, t in enumerate(timestamps))
+    
+    processor = LoadProfileProcessor('BW')
+    source_df = processor.parse_load_profile(csv)
+    result = processor.generate_future_profiles(source_df, [2026])[2026]
+    
+    assert len(result) == 365 * 96
+    assert source_df['hour'].iloc[0] == 0
+
+
+def test_parsed_loads_export_unchanged():
+    csv = "timestamp;load\n2024-01-01 00:00;256070,18\n2024-01-01 00:15;249999,99"
+    processor = LoadProfileProcessor('BW')
+    source_df = processor.parse_load_profile(csv)
+    
+    exported = processor.export_to_csv(source_df, include_source=False)
+    assert exported.split('\n')[1:] == ['2024-01-01 00:00;256070,18', '2024-01-01 00:15;249999,99']
+
+
+def test_nearest_day_of_year_matches_a_linear_scan():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        # Repeated days of year stand in for multi-year sources, sparse draws leave gaps
+        size = int(rng.integers(1, 60))
+        doys = rng.integers(1, 367, size)
+        positions = rng.permutation(size)
+        order = np.lexsort((positions, doys))
+        doys, positions = doys[order], positions[order]
+        
+        expected = [min(range(size), key=lambda i: (abs(doys[i] - day), positions[i])) for day in range(367)]
+        np.testing.assert_array_equal(_nearest_day_of_year(doys, positions), expected)
+
+
+def _stub_holiday_api(monkeypatch, school_holidays: dict):
+    """Serve a single public holiday per year and the given school holiday periods per year"""
+    def payload(url, *args, **kwargs):
+        year = int(url.rstrip('/').rsplit('/', 2)[-2 if 'nager' in url else -1])
+        if 'nager' in url:
+            return [{'date': f'{year}-05-01', 'localName': 'Tag der Arbeit'}]
+        return [{'start': start, 'end': end, 'name': 'Weihnachtsferien'} for start, end in school_holidays.get(year, [])]
+    monkeypatch.setattr('holiday_fetcher_improved._get_json', payload)
+
+
+def _daily_profile(year: int) -> pd.DataFrame:
+    """A year of 15-minute loads where every interval holds its day's ordinal, so days are traceable"""
+    timestamps = pd.date_range(f'{year}-01-01', f'{year}-12-31 23:45', freq='15min')
+    ordinals = np.array([day.toordinal() for day in timestamps.date], dtype=np.float64)
+    return pd.DataFrame({'timestamp': timestamps, 'load': ordinals})
+
+
+def _mapped_source_days(result: pd.DataFrame) -> Dict[date, date]:
+    days = result['timestamp'].dt.date
+    return {day: date.fromordinal(int(load)) for day, load in zip(days[::96], result['load'].to_numpy()[::96])}
+
+
+def test_school_holiday_position_counts_from_dec_31_of_previous_year(monkeypatch):
+    _stub_holiday_api(monkeypatch, {2024: [('2024-12-23', '2024-12-31')], 2026: [('2025-12-22', '2026-01-05')]})
+    processor = LoadProfileProcessor('BW')
+    result = processor.generate_future_profiles(_daily_profile(2024), [2026])[2026]
+    sources = result['source'].astype(str).to_numpy()[::96]
+    mapped = _mapped_source_days(result)
+    
+    # The run seen from Jan 1 starts on Dec 31, the last day of the previous year
+    assert sources[0].endswith('from 2024-12-24 (day 2)')
+    assert sources[4].endswith('from 2024-12-28 (day 6)')
+    assert mapped[date(2026, 1, 1)] == date(2024, 12, 24)
+    assert mapped[date(2026, 1, 5)] == date(2024, 12, 28)
+    assert not sources[5].startswith('School holiday')
+
+
+def test_weekend_lookup_matches_whole_calendar_week(monkeypatch):
+    # Jan 6, 2024, the source's only KW1 Saturday, is a school holiday
+    _stub_holiday_api(monkeypatch, {2024: [('2024-01-02', '2024-01-06')]})
+    processor = LoadProfileProcessor('BW')
+    result = processor.generate_future_profiles(_daily_profile(2024), [2026])[2026]
+    sources = result['source'].astype(str).to_numpy()[::96]
+    mapped = _mapped_source_days(result)
+    
+    # Jan 3, 2026 is the Saturday of KW1: no KW10-KW19 weekend may stand in for it
+    assert mapped[date(2026, 1, 3)] == date(2024, 1, 13)
+    assert sources[2] == 'Weekend KW2 from 2024-01-13'
+    # Weekends with their week in the source keep the exact match
+    assert mapped[date(2026, 3, 7)] == date(2024, 3, 9)